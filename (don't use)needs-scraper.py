@@ -1,8 +1,11 @@
 import os
 import re
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import requests
-import pdfplumber
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import fitz  # PyMuPDF
 from bs4 import BeautifulSoup
 
 # -----------------------------
@@ -16,34 +19,83 @@ HEADERS = {
     "Accept": "application/pdf"
 }
 
+DOWNLOAD_WORKERS = 16
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+INSERT_BATCH_SIZE = 100  # rows per transaction
+
+# Kept as one constant string so sqlite3's statement cache reuses the
+# prepared statement across batches. Re-scraping a URL replaces its row.
+INSERT_SQL = """
+    INSERT OR REPLACE INTO dns_pdfs (borough, cb_number, pdf_url, text)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Brooklyn (BK) statements from fiscal years 2024-2026, in either order
+# within the path (e.g. BK01_FY2024.pdf or FY2024_Statement_BK01.pdf)
+BK_2024_2026_RE = re.compile(r"^(?=.*BK)(?=.*202[456])")
+# Two-digit community district number in a Brooklyn filename (BK01 -> 01)
+BK_FILE_RE = re.compile(r"BK(\d{2})")
+
+# Shared keep-alive session; retries back off on rate limiting / 5xx
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
 # -----------------------------
 # DATABASE SETUP
 # -----------------------------
+def configure_db(conn):
+    """Tune SQLite for bulk inserts: WAL journal, fewer fsyncs, bigger cache."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+
+
 def init_db():
     conn = sqlite3.connect("dns_data.db")
+    configure_db(conn)
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS dns_pdfs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            id INTEGER PRIMARY KEY,
             borough TEXT,
             cb_number INTEGER,
             pdf_url TEXT,
             text TEXT
         )
     """)
+    # pdf_url uniqueness lives in idx_pdf_url rather than a column constraint,
+    # so databases created before it get it too (otherwise INSERT OR REPLACE
+    # would keep appending). Drop older duplicates first, keeping the latest
+    # row per URL.
+    cur.execute("""
+        DELETE FROM dns_pdfs
+        WHERE pdf_url IS NOT NULL
+          AND id NOT IN (SELECT MAX(id) FROM dns_pdfs GROUP BY pdf_url)
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pdf_url ON dns_pdfs (pdf_url)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bk_cb ON dns_pdfs (borough, cb_number, pdf_url)
+    """)
     conn.commit()
     return conn
 
 
 # -----------------------------
-# GET ALL PDF LINKS
+# GET BROOKLYN 2024-2026 PDF LINKS
 # -----------------------------
 def get_raw_pdf_links():
-    """Use GitHub API to recursively get all PDF files"""
+    """Use GitHub API to recursively list Brooklyn 2024-2026 PDF files"""
     api_url = "https://api.github.com/repos/NYCPlanning/labs-cd-needs-statements/git/trees/master?recursive=1"
     headers = {"Accept": "application/vnd.github.v3+json"}
 
-    r = requests.get(api_url, headers=headers)
+    r = SESSION.get(api_url, headers=headers)
     r.raise_for_status()
     data = r.json()
 
@@ -51,9 +103,10 @@ def get_raw_pdf_links():
 
     if "tree" in data:
         for item in data["tree"]:
-            if item["path"].endswith(".pdf"):
+            path = item["path"]
+            if path.endswith(".pdf") and BK_2024_2026_RE.match(path):
                 # Convert to raw download URL
-                raw_url = f"https://raw.githubusercontent.com/NYCPlanning/labs-cd-needs-statements/master/{item['path']}"
+                raw_url = f"https://raw.githubusercontent.com/NYCPlanning/labs-cd-needs-statements/master/{path}"
                 pdf_links.append(raw_url)
 
     return pdf_links
@@ -67,11 +120,12 @@ def download_pdf(url):
     filename = url.split("/")[-1]
     path = f"dns_pdfs/{filename}"
 
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-
-    with open(path, "wb") as f:
-        f.write(r.content)
+    # Stream to disk so only one chunk per download is held in memory
+    with SESSION.get(url, headers=HEADERS, stream=True) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
 
     return path
 
@@ -80,74 +134,81 @@ def download_pdf(url):
 # EXTRACT PDF TEXT
 # -----------------------------
 def extract_text(path):
-    text = ""
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
+    # Plain text only, so PyMuPDF's native parser is far cheaper than
+    # building pdfplumber's per-character object graph. Pages are loaded
+    # one at a time, so memory stays flat regardless of page count.
+    texts = []
+    with fitz.open(path) as doc:
+        for page in doc:
             try:
-                text += page.extract_text() + "\n"
-            except:
-                pass
-    return text
+                texts.append(page.get_text("text"))
+            except RuntimeError as e:  # MuPDF error on a damaged page
+                print(f"  ! Skipping page {page.number + 1} of {path}: {e}")
+    return "\n".join(texts)
 
 
 # -----------------------------
 # INSERT INTO DATABASE
 # -----------------------------
-def save_to_db(conn, borough, cb_number, pdf_url, text):
+def save_to_db(conn, rows):
+    """Insert (borough, cb_number, pdf_url, text) rows in a single transaction"""
     cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO dns_pdfs (borough, cb_number, pdf_url, text)
-        VALUES (?, ?, ?, ?)
-    """, (borough, cb_number, pdf_url, text))
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.executemany(INSERT_SQL, rows)
+    except Exception:
+        conn.rollback()
+        raise
     conn.commit()
 
 
-# -----------------------------
-# FILTER BROOKLYN 2024-2026
-# -----------------------------
-def filter_brooklyn_2024_2026(pdf_urls):
-    """Filter for Brooklyn needs statements from 2024, 2025, and 2026"""
-    filtered = []
-    for url in pdf_urls:
-        # Check if it's Brooklyn (BK) and from fiscal years 2024, 2025, or 2026
-        if 'BK' in url and any(year in url for year in ['FY2024', 'FY2025', 'FY2026', '2024', '2025', '2026']):
-            filtered.append(url)
-    return filtered
-
-
 # -----------------------------
 # MAIN SCRAPER LOGIC
 # -----------------------------
 def run():
     conn = init_db()
-    all_pdf_urls = get_raw_pdf_links()
-
-    # Filter for Brooklyn 2024-2026 only
-    pdf_urls = filter_brooklyn_2024_2026(all_pdf_urls)
+    pdf_urls = get_raw_pdf_links()
 
-    print(f"Found {len(all_pdf_urls)} total PDFs")
-    print(f"Filtered to {len(pdf_urls)} Brooklyn 2024-2026 PDFs")
+    print(f"Found {len(pdf_urls)} Brooklyn 2024-2026 PDFs")
     print("\nBrooklyn PDFs to download:")
     for url in pdf_urls:
         print(f"  - {url.split('/')[-1]}")
     print()
 
-    for i, url in enumerate(pdf_urls, 1):
-        print(f"[{i}/{len(pdf_urls)}] Downloading: {url.split('/')[-1]}")
-
-        # extract borough + district ID from filename
-        match = re.findall(r'BK(\d{2})', url)
-        if match:
-            borough = "BK"
-            cb_num = int(match[0])
-        else:
-            borough, cb_num = ("UNKNOWN", None)
-
-        path = download_pdf(url)
-        text = extract_text(path)
-        save_to_db(conn, borough, cb_num, url, text)
+    # Downloads are network bound, so fetch them concurrently
+    print(f"Downloading {len(pdf_urls)} PDFs ({DOWNLOAD_WORKERS} at a time)...")
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+        paths = list(ex.map(download_pdf, pdf_urls))
+    print()
 
-        print(f"  ✓ Saved: Brooklyn CB{cb_num}\n")
+    # Text extraction is CPU bound, so parse one PDF per worker process.
+    # Results arrive in order and are written in batches, so extracted
+    # text never piles up in memory for the whole run.
+    print(f"Extracting text from {len(paths)} PDFs...")
+    rows = []
+    saved = 0
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        for url, text in zip(pdf_urls, ex.map(extract_text, paths)):
+            # extract borough + district ID from filename
+            match = BK_FILE_RE.search(url)
+            if match:
+                borough = "BK"
+                cb_num = int(match.group(1))
+            else:
+                borough, cb_num = ("UNKNOWN", None)
+
+            rows.append((borough, cb_num, url, text))
+            print(f"  ✓ Extracted: Brooklyn CB{cb_num} ({url.split('/')[-1]})")
+
+            if len(rows) >= INSERT_BATCH_SIZE:
+                save_to_db(conn, rows)
+                saved += len(rows)
+                rows = []
+
+    if rows:
+        save_to_db(conn, rows)
+        saved += len(rows)
+    print(f"Saved {saved} PDFs to dns_data.db")
 
 if __name__ == "__main__":
     run()
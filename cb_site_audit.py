@@ -6,16 +6,22 @@ site appears to contain common resources (calendar, minutes, social links, etc.)
 import json
 import os
 import re
+import threading
 import time
-from html.parser import HTMLParser
-from typing import Dict, List, Tuple
-from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from urllib.parse import urljoin, urlparse
 
 import requests
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 CB_LIST_URL = "https://www.nyc.gov/site/cau/community-boards/brooklyn-boards.page"
 OUTPUT_PATH = os.path.join("api_outputs", "cb_site_audit.json")
 REQUEST_TIMEOUT = 25
+MAX_CONCURRENT_FETCHES = 8
+CB_LABEL_RE = re.compile(r"Brooklyn\s*CB\s*(\d+)", re.IGNORECASE)
 REQUEST_HEADERS = {
     # Present as a standard browser to reduce 403/406 responses.
     "User-Agent": (
@@ -27,6 +33,21 @@ REQUEST_HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
+# Minimum spacing between requests to the same host.
+PER_HOST_INTERVAL = 0.5
+
+# One pooled session so repeat hits to a host reuse the TCP/TLS connection.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.5),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+_next_request_at: Dict[str, float] = {}
+_throttle_lock = threading.Lock()
+
 KEY_ITEMS = [
     "Calendar",
     "Minutes",
@@ -45,55 +66,70 @@ KEY_ITEMS = [
     "Permits and Licenses",
 ]
 
+# Substrings whose presence anywhere in a page marks a feature.
+FEATURE_TERMS = {
+    "Calendar": ["calendar"],
+    "Minutes": ["minutes"],
+    "Agendas": ["agenda"],
+    "Meetings": ["meeting"],
+    "Resolutions": ["resolution"],
+    "Contact": ["contact"],
+    "Instagram": ["instagram"],
+    "X": ["x.com", "twitter"],
+    "Facebook": ["facebook"],
+    "Youtube": ["youtube", "youtu.be"],
+    "Newsletters": ["newsletter"],
+    "By-Laws": ["by-laws", "bylaws", "by laws"],
+    "News": ["news"],
+    "Events": ["event"],
+    "Permits and Licenses": ["permit", "license"],
+}
 
-class LinkParser(HTMLParser):
-    """Lightweight anchor tag collector using stdlib HTML parser."""
-
-    def __init__(self):
-        super().__init__()
-        self.links: List[Tuple[str, str]] = []
-        self._in_a = False
-        self._href = None
-        self._buf: List[str] = []
-
-    def handle_starttag(self, tag, attrs):
-        if tag != "a":
-            return
-        attr_dict = dict(attrs)
-        self._href = attr_dict.get("href")
-        self._buf = []
-        self._in_a = True
-
-    def handle_data(self, data):
-        if self._in_a:
-            self._buf.append(data)
-
-    def handle_endtag(self, tag):
-        if tag != "a" or not self._in_a:
-            return
-        text = "".join(self._buf).strip()
-        if self._href:
-            self.links.append((text, self._href))
-        self._in_a = False
-        self._href = None
-        self._buf = []
+# Each matched term also counts every feature whose terms it contains
+# (e.g. "newsletter" implies "news"), matching plain substring checks.
+_TERM_FEATURES = {
+    term: [item for item, terms in FEATURE_TERMS.items() if any(t in term for t in terms)]
+    for terms in FEATURE_TERMS.values()
+    for term in terms
+}
+# Single pass over the lowercased page: the lookahead reports the longest term
+# starting at every position, so overlapping terms are not skipped. Matched
+# case-sensitively since IGNORECASE would also accept Unicode folds ("ſ", "İ")
+# that don't map back to a key of _TERM_FEATURES.
+_FEATURE_RE = re.compile(
+    "(?=("
+    + "|".join(re.escape(t) for t in sorted(_TERM_FEATURES, key=len, reverse=True))
+    + "))"
+)
+
+
+def _throttle(url: str) -> None:
+    """Space out requests per host instead of pausing between every fetch."""
+    host = urlparse(url).netloc
+    with _throttle_lock:
+        now = time.monotonic()
+        slot = max(now, _next_request_at.get(host, now))
+        _next_request_at[host] = slot + PER_HOST_INTERVAL
+    if slot > now:
+        time.sleep(slot - now)
 
 
 def fetch_html(url: str) -> str:
-    resp = requests.get(url, timeout=REQUEST_TIMEOUT, headers=REQUEST_HEADERS)
+    _throttle(url)
+    resp = SESSION.get(url, timeout=REQUEST_TIMEOUT, headers=REQUEST_HEADERS)
     resp.raise_for_status()
     return resp.text
 
 
 def extract_cb_links() -> Dict[str, str]:
     """Return mapping of CB number -> website URL from the CAU Brooklyn page."""
-    html = fetch_html(CB_LIST_URL)
-    parser = LinkParser()
-    parser.feed(html)
+    tree = lxml_html.fromstring(fetch_html(CB_LIST_URL))
 
     cb_links: Dict[str, str] = {}
-    for text, href in parser.links:
-        match = re.search(r"Brooklyn\s*CB\s*(\d+)", text, re.IGNORECASE)
+    for anchor in tree.iterfind(".//a"):
+        text = anchor.text_content().strip()
+        href = anchor.get("href") or ""
+        match = CB_LABEL_RE.search(text)
         if not match:
             continue
         cb_num = match.group(1)
@@ -107,45 +143,32 @@ def extract_cb_links() -> Dict[str, str]:
 
 def detect_features(html: str, url: str) -> Dict[str, bool]:
     """Heuristic presence checks across full HTML text."""
-    text = html.lower()
     features = {item: False for item in KEY_ITEMS}
+    remaining = len(features)
 
-    basic_map = {
-        "calendar": ["calendar"],
-        "minutes": ["minutes"],
-        "agendas": ["agenda"],
-        "meetings": ["meeting"],
-        "resolutions": ["resolution"],
-        "contact": ["contact"],
-        "newsletters": ["newsletter"],
-        "by-laws": ["by-laws", "bylaws", "by laws"],
-        "news": ["news"],
-        "events": ["events", "event"],
-        "permits and licenses": ["permit", "license"],
-    }
-
-    social_map = {
-        "instagram": ["instagram.com", "instagram"],
-        "x": ["x.com", "twitter.com", "twitter"],
-        "facebook": ["facebook.com", "facebook"],
-        "youtube": ["youtube.com", "youtu.be", "youtube"],
-    }
-
-    for key, terms in basic_map.items():
-        features[_canonical_key(key)] = any(term in text for term in terms)
-
-    for key, terms in social_map.items():
-        features[_canonical_key(key)] = any(term in text for term in terms)
+    for match in _FEATURE_RE.finditer(html.lower()):
+        for item in _TERM_FEATURES[match.group(1)]:
+            if not features[item]:
+                features[item] = True
+                remaining -= 1
+        if not remaining:
+            break
 
     return features
 
 
-def _canonical_key(name: str) -> str:
-    """Match KEY_ITEMS label casing."""
-    for item in KEY_ITEMS:
-        if item.lower() == name.lower():
-            return item
-    return name
+def audit_site(cb_num: str, url: str) -> Dict:
+    """Fetch one CB site and record which features it appears to have."""
+    print(f"Fetching CB{cb_num}: {url}")
+    record = {"cb_number": cb_num, "url": url}
+    try:
+        html = fetch_html(url)
+        record["status"] = "ok"
+        record["features"] = detect_features(html, url)
+    except Exception as exc:  # noqa: BLE001
+        record["status"] = "error"
+        record["error"] = str(exc)
+    return record
 
 
 def audit():
@@ -154,19 +177,10 @@ def audit():
     cb_links = extract_cb_links()
     print(f"Found {len(cb_links)} Brooklyn CB sites.")
 
-    results = []
-    for cb_num, url in sorted(cb_links.items(), key=lambda x: int(x[0])):
-        print(f"Fetching CB{cb_num}: {url}")
-        record = {"cb_number": cb_num, "url": url}
-        try:
-            html = fetch_html(url)
-            record["status"] = "ok"
-            record["features"] = detect_features(html, url)
-        except Exception as exc:  # noqa: BLE001
-            record["status"] = "error"
-            record["error"] = str(exc)
-        results.append(record)
-        time.sleep(0.5)  # gentle pacing
+    # Each CB is on its own host, so the fetches can overlap.
+    sites = sorted(cb_links.items(), key=lambda x: int(x[0]))
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES) as pool:
+        results = list(pool.map(lambda site: audit_site(*site), sites))
 
     with open(OUTPUT_PATH, "w") as f:
         json.dump({"source": CB_LIST_URL, "results": results}, f, indent=2)
@@ -1,11 +1,18 @@
+import asyncio
 import json
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from needs_analysis._llm_cache import cached_response_async
 
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+MODEL = "gpt-4o-2024-08-06"
+SYSTEM_PROMPT = "You are an expert policy analyst specializing in municipal governance and community needs assessment. You extract themes and score their emphasis based on textual evidence."
+TEMPERATURE = 0.2  # low enough for repeatable JSON, so responses are cached
 
-def extract_themes_for_cb(cb_number):
+async def extract_themes_for_cb(cb_number):
     """
     Use GPT to extract themes from a CB's comparison JSON
     """
@@ -19,7 +26,7 @@ def extract_themes_for_cb(cb_number):
     prompt = f"""Analyze this 3-year community board needs comparison and extract the KEY THEMES that appear across the years.
 
 COMPARISON DATA:
-{json.dumps(data, indent=2)}
+{json.dumps(data, separators=(",", ":"))}
 
 INSTRUCTIONS:
 1. Identify 4-6 major policy themes that appear across FY2024, FY2025, and FY2026
@@ -55,29 +62,48 @@ OUTPUT FORMAT (valid JSON only):
 
 Return ONLY valid JSON, no other text."""
 
-    # Call OpenAI
-    response = client.chat.completions.create(
-        model="gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": "You are an expert policy analyst specializing in municipal governance and community needs assessment. You extract themes and score their emphasis based on textual evidence."},
-            {"role": "user", "content": prompt}
-        ],
-        response_format={"type": "json_object"},
-        temperature=0.3
+    async def request():
+        # Call OpenAI
+        response = await client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=TEMPERATURE
+        )
+        return response.choices[0].message.content
+
+    # Same cache and temperature gate as the needs_analysis scripts
+    content = await cached_response_async(
+        MODEL, prompt, TEMPERATURE, request, system=SYSTEM_PROMPT
     )
 
-    result = json.loads(response.choices[0].message.content)
+    result = json.loads(content)
     return result
 
+async def extract_all_themes(cb_numbers):
+    """Request themes for every CB concurrently; failures are returned, not raised"""
+    return await asyncio.gather(
+        *(extract_themes_for_cb(cb_num) for cb_num in cb_numbers),
+        return_exceptions=True
+    )
+
 def main():
     """Extract themes for all 5 Brooklyn CBs"""
     all_themes = {}
+    cb_numbers = range(1, 6)
+
+    print(f"\n🔍 Extracting themes for Brooklyn CB{cb_numbers[0]}-CB{cb_numbers[-1]}...")
+    results = asyncio.run(extract_all_themes(cb_numbers))
 
-    for cb_num in range(1, 6):
-        print(f"\n🔍 Extracting themes for Brooklyn CB{cb_num}...")
+    for cb_num, themes_data in zip(cb_numbers, results):
+        print(f"\nBrooklyn CB{cb_num}:")
 
         try:
-            themes_data = extract_themes_for_cb(cb_num)
+            if isinstance(themes_data, Exception):
+                raise themes_data
             all_themes[f"CB{cb_num}"] = themes_data
             print(f"  ✓ Found {len(themes_data['themes'])} themes")
 
@@ -1,17 +1,33 @@
+import asyncio
+import os
 import sqlite3
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-client = OpenAI()
+from needs_analysis._llm_cache import cached_response_async
+
+# The SDK retries 429/5xx with jittered backoff and honors Retry-After;
+# allow a few more attempts than its default of 2 when running at the limit.
+client = AsyncOpenAI(max_retries=5)
+MODEL = "gpt-4.1"
+TEMPERATURE = 0.2  # low enough for repeatable JSON, so responses are cached
+MAX_CONCURRENT_REQUESTS = int(os.getenv("LLM_CONCURRENCY", "8"))
 
 def get_all_statements():
+    """One statement per CB: the most recently scraped row, the same one that
+    ended up in the output file when rows were processed in order."""
     conn = sqlite3.connect("dns_data.db")
     cur = conn.cursor()
-    rows = cur.execute("SELECT id, borough, cb_number, text FROM dns").fetchall()
+    rows = cur.execute("""
+        SELECT id, borough, cb_number, text
+        FROM dns
+        WHERE id IN (SELECT MAX(id) FROM dns GROUP BY borough, cb_number)
+        ORDER BY id
+    """).fetchall()
     conn.close()
     return rows
 
 # Example LLM prompt
-def analyze(text, borough, cb_number):
+async def analyze(text, borough, cb_number):
     prompt = f"""
 You are analyzing a New York City Community District Needs Statement.
 
@@ -31,25 +47,43 @@ Return your analysis in structured JSON with keys:
 summary, themes, unmet_needs, mentions, priority_ranking
 """
 
-    resp = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    async def request():
+        resp = await client.chat.completions.create(
+            model=MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE
+        )
+        return resp.choices[0].message.content
 
-    return resp.choices[0].message.content
+    # Reruns on unchanged statements are served from the shared cache
+    return await cached_response_async(MODEL, prompt, TEMPERATURE, request)
 
 
-def run():
-    rows = get_all_statements()
-
-    for (id_, borough, cb, text) in rows:
+async def analyze_and_save(sem, borough, cb, text):
+    async with sem:
         print(f"\nAnalyzing {borough} CB{cb}...")
-        output = analyze(text, borough, cb)
+        output = await analyze(text, borough, cb)
+
+    # get_all_statements yields one row per CB, so concurrent tasks never
+    # share an output file
+    filename = f"analysis_CB{borough}{cb}.json"
+    with open(filename, "w") as f:
+        f.write(output)
 
-        with open(f"analysis_CB{borough}{cb}.json", "w") as f:
-            f.write(output)
+    print(f"Saved {filename}!")
 
-        print("Saved!")
+
+async def run_all(rows):
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    await asyncio.gather(*(
+        analyze_and_save(sem, borough, cb, text)
+        for (_, borough, cb, text) in rows
+    ))
+
+
+def run():
+    rows = get_all_statements()
+    asyncio.run(run_all(rows))
 
 if __name__ == "__main__":
     run()
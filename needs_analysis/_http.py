@@ -0,0 +1,35 @@
+"""
+Pooled HTTP session shared by the needs_analysis scripts and the top-level
+scripts that call GitHub and Ollama (imported there as needs_analysis._http).
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+def make_session(pool_maxsize=10):
+    """Keep-alive session sized for ``pool_maxsize`` concurrent requests.
+
+    Failed connects are retried for every method. 429/5xx responses are only
+    retried for idempotent methods (urllib3's default), so a failing model is
+    not asked to regenerate a long POST three more times. With
+    raise_on_status=False the last response is returned instead of a
+    RetryError, so callers still see the server's error body.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        ),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
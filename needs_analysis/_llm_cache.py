@@ -0,0 +1,89 @@
+"""
+SQLite-backed cache of LLM responses shared by the needs_analysis scripts and
+the top-level OpenAI scripts (imported there as needs_analysis._llm_cache).
+
+Responses are keyed by a hash of the model, the prompt and any other request
+inputs, so re-running a script on unchanged statements costs no tokens.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+CACHE_DB = "llm_cache.sqlite"
+# Sampling above this is too random to treat a stored answer as reusable.
+MAX_CACHEABLE_TEMPERATURE = 0.2
+
+_local = threading.local()
+
+
+def _connect():
+    """One connection per thread; WAL lets concurrent workers read while one writes."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_DB)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+        )
+        _local.conn = conn
+    return conn
+
+
+def cache_key(model, prompt, **extra):
+    # Whitespace runs are collapsed so re-extracted statements that differ only
+    # in spacing or line endings still hit; the model reads them the same way.
+    prompt = " ".join(prompt.split())
+    payload = json.dumps({"model": model, "prompt": prompt, **extra}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cacheable(temperature):
+    return temperature is not None and temperature <= MAX_CACHEABLE_TEMPERATURE
+
+
+def _lookup(key):
+    row = _connect().execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def _store(key, response):
+    conn = _connect()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response) VALUES (?, ?)", (key, response)
+        )
+
+
+def cached_response(model, prompt, temperature, call, **extra):
+    """Return call()'s response text, served from the cache when possible.
+
+    ``extra`` holds any other inputs that change the answer (system prompt,
+    provider, ...) and is folded into the key. Requests sampled above
+    MAX_CACHEABLE_TEMPERATURE (or at the provider default, ``None``) always
+    go to the model.
+    """
+    if not _cacheable(temperature):
+        return call()
+
+    key = cache_key(model, prompt, temperature=temperature, **extra)
+    response = _lookup(key)
+    if response is None:
+        response = call()
+        _store(key, response)
+    return response
+
+
+async def cached_response_async(model, prompt, temperature, call, **extra):
+    """cached_response for async clients: ``call()`` returns an awaitable."""
+    if not _cacheable(temperature):
+        return await call()
+
+    key = cache_key(model, prompt, temperature=temperature, **extra)
+    response = _lookup(key)
+    if response is None:
+        response = await call()
+        _store(key, response)
+    return response
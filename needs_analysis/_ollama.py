@@ -0,0 +1,47 @@
+"""
+Streaming completions from a local Ollama server, shared by the Ollama
+needs_analysis scripts.
+"""
+
+import orjson
+
+GENERATE_API = "http://localhost:11434/api/generate"
+
+
+def stream_generate(session, model, prompt, options, out=None):
+    """Stream a completion from Ollama, writing tokens to ``out`` as they arrive.
+
+    Raises if Ollama reports an error or the stream ends before its final
+    ``"done": true`` line, so a truncated response is never returned (and so
+    never stored by cached_response).
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True,
+        "options": options,
+    }
+
+    tokens = []
+    done = False
+    with session.post(GENERATE_API, json=payload, stream=True) as response:
+        response.raise_for_status()
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = orjson.loads(line)
+            if "error" in chunk:
+                raise RuntimeError(f"Ollama error: {chunk['error']}")
+            token = chunk.get("response", "")
+            tokens.append(token)
+            if out is not None:
+                out.write(token)
+            if chunk.get("done"):
+                done = True
+                break
+
+    if not done:
+        raise RuntimeError("Ollama stream ended before the response was done")
+
+    return "".join(tokens)
@@ -0,0 +1,26 @@
+"""
+Atomic writes for the needs_analysis output files.
+"""
+
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(filename, mode="w", buffering=-1):
+    """Open a temp file next to ``filename`` and move it into place only if the
+    block completes; on any error the temp file is removed and the previous
+    output is left untouched.
+
+    Since outputs only ever appear through this rename, an existing output
+    file is a finished one and the scripts skip it on reruns.
+    """
+    tmp_filename = filename + ".tmp"
+    try:
+        with open(tmp_filename, mode, buffering=buffering) as f:
+            yield f
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
@@ -0,0 +1,101 @@
+"""
+Multi-year comparison prompt shared by the needs_analysis scripts.
+
+COMPARE_RULES is identical for every CB and goes first (or as the system
+message) so providers and Ollama can reuse the cached prompt prefix; only the
+COMPARE_REQUEST tail is filled in per CB.
+"""
+
+import re
+from string import Template
+
+DOC_CHAR_LIMIT = 15000  # per-year budget of statement text sent to the model
+_SPACE_RE = re.compile(r"[ \t\f\v\xa0]+")
+
+
+def condense(text, limit=DOC_CHAR_LIMIT):
+    """Truncate a statement to limit characters after squeezing out the runs of
+    spaces and blank lines left by PDF extraction, so the budget holds more content."""
+    lines = (_SPACE_RE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)[:limit]
+
+
+COMPARE_RULES = """CRITICAL INSTRUCTIONS: You MUST compare THREE different years of documents. DO NOT extract or summarize a single document. You are doing COMPARATIVE ANALYSIS ONLY.
+
+YOU WILL RECEIVE THREE DOCUMENTS:
+- Document 1: FY2024 needs statement
+- Document 2: FY2025 needs statement
+- Document 3: FY2026 needs statement
+
+YOUR JOB: Compare how things CHANGED from 2024 → 2025 → 2026.
+
+ANALYSIS TASKS:
+1. Policy Changes: What priorities appeared, disappeared, or shifted emphasis across the 3 years?
+2. Agency Response Evolution: Did city agencies become more supportive, dismissive, or neutral? How did their tone/responses change?
+3. Emphasis Shifts: Which themes grew stronger? Which faded? What's new in 2026 that wasn't in 2024?
+4. Structural Changes: Did document format, length, or organization change?
+
+CRITICAL: Cite specific text from EACH year when you compare. Say things like "In FY2024 the document stated X, but by FY2026 it shifted to Y."
+
+REQUIRED JSON OUTPUT STRUCTURE:
+{
+  "community_board": "<community board named in the request>",
+  "summary_table": {
+    "FY2024": "One-sentence summary of FY2024 document's main focus",
+    "FY2025": "One-sentence summary of FY2025 document's main focus",
+    "FY2026": "One-sentence summary of FY2026 document's main focus"
+  },
+  "narrative_comparison": {
+    "policy_changes": "2-3 paragraphs comparing how policy priorities evolved from 2024 to 2026. Cite specific examples from each year.",
+    "agency_response_evolution": "2 paragraphs on how city agency responses changed. Quote or reference agency statements from different years.",
+    "emphasis_shifts": "2 paragraphs on what themes grew, shrank, or disappeared. Be specific about which year emphasized what.",
+    "structural_changes": "1 paragraph on document format/structure differences across years."
+  },
+  "notable_quotes": [
+    {
+      "year": "FY2024",
+      "quote": "Exact quote from FY2024 document",
+      "significance": "Why this quote matters for year-over-year comparison"
+    },
+    {
+      "year": "FY2025",
+      "quote": "Exact quote from FY2025 document",
+      "significance": "How this differs from or continues FY2024 themes"
+    },
+    {
+      "year": "FY2026",
+      "quote": "Exact quote from FY2026 document",
+      "significance": "How this represents evolution from prior years"
+    }
+  ],
+  "final_interpretation": "2-3 sentence assessment of the overall 3-year trajectory. What's the big story here?"
+}
+"""
+
+COMPARE_REQUEST = Template("""$borough Community Board $cb_number - YEAR-OVER-YEAR COMPARISON
+
+===== FY2024 DOCUMENT BEGINS =====
+$fy2024
+===== FY2024 DOCUMENT ENDS =====
+
+===== FY2025 DOCUMENT BEGINS =====
+$fy2025
+===== FY2025 DOCUMENT ENDS =====
+
+===== FY2026 DOCUMENT BEGINS =====
+$fy2026
+===== FY2026 DOCUMENT ENDS =====
+
+NOW: Output ONLY the JSON comparison analysis. Do NOT summarize a single year. COMPARE ALL THREE YEARS.
+""")
+
+
+def compare_request(borough, cb_number, fy2024, fy2025, fy2026):
+    """Fill in the per-CB part of the comparison prompt (follows COMPARE_RULES)."""
+    return COMPARE_REQUEST.substitute(
+        borough=borough,
+        cb_number=cb_number,
+        fy2024=condense(fy2024),
+        fy2025=condense(fy2025),
+        fy2026=condense(fy2026),
+    )
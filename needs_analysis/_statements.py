@@ -0,0 +1,47 @@
+"""
+Loads the scraped needs statements (dns_data.db) for the needs_analysis scripts.
+"""
+
+import itertools
+import re
+import sqlite3
+
+# Fiscal year of a statement, from its PDF file name (e.g. FY2025_Statement_BK01.pdf
+# or BK02_2024.pdf, both of which the scraper keeps). Matched on the file name
+# only, so a year in a directory segment is ignored, and never inside a longer
+# number.
+YEAR_RE = re.compile(r"(?<!\d)(?:FY)?(202[4-6])(?!\d)")
+
+
+def get_statements_by_cb(borough="BK"):
+    """Statements grouped by community board number, keeping only CBs that
+    have all three fiscal years: {cb_number: {"FY2024": text, ...}}."""
+    conn = sqlite3.connect("dns_data.db")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+
+    # One ordered scan instead of a query per CB; the scraper's init_db creates
+    # idx_bk_cb(borough, cb_number, pdf_url) to serve the filter and ordering
+    rows = conn.execute(
+        """
+        SELECT cb_number, pdf_url, text
+        FROM dns_pdfs
+        WHERE borough = ?
+        ORDER BY cb_number, pdf_url
+        """,
+        (borough,),
+    )
+
+    results = {}
+    for cb_num, group in itertools.groupby(rows, key=lambda row: row[0]):
+        statements = {}
+        for _, url, text in group:
+            match = YEAR_RE.search(url.rsplit("/", 1)[-1])
+            if match:
+                statements[f"FY{match.group(1)}"] = text
+
+        if len(statements) == 3:
+            results[cb_num] = statements
+
+    conn.close()
+    return results
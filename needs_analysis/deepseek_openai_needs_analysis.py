@@ -1,120 +1,53 @@
 import argparse
 import os
-import sqlite3
-import requests
-
-
-def get_statements_by_cb(borough: str = "BK"):
-    """Fetch statements grouped by community board number for the given borough."""
-    conn = sqlite3.connect("dns_data.db")
-    cur = conn.cursor()
-
-    cb_numbers = cur.execute(
-        "SELECT DISTINCT cb_number FROM dns_pdfs WHERE borough = ? ORDER BY cb_number",
-        (borough,),
-    ).fetchall()
-
-    results = {}
-    for (cb_num,) in cb_numbers:
-        rows = cur.execute(
-            """
-            SELECT pdf_url, text
-            FROM dns_pdfs
-            WHERE borough = ? AND cb_number = ?
-            ORDER BY pdf_url
-            """,
-            (borough, cb_num),
-        ).fetchall()
-
-        statements = {}
-        for url, text in rows:
-            if "FY2024" in url or "2024" in url:
-                statements["FY2024"] = text
-            elif "FY2025" in url or "2025" in url:
-                statements["FY2025"] = text
-            elif "FY2026" in url or "2026" in url:
-                statements["FY2026"] = text
-
-        if len(statements) == 3:
-            results[cb_num] = statements
-
-    conn.close()
-    return results
-
-
-def build_prompt(cb_number, fy2024, fy2025, fy2026, borough):
-    """Construct the comparison prompt shared by both providers."""
-    return f"""CRITICAL INSTRUCTIONS: You MUST compare THREE different years of documents. DO NOT extract or summarize a single document. You are doing COMPARATIVE ANALYSIS ONLY.
-
-{borough} Community Board {cb_number} - YEAR-OVER-YEAR COMPARISON
-
-YOU HAVE THREE DOCUMENTS BELOW:
-- Document 1: FY2024 needs statement
-- Document 2: FY2025 needs statement
-- Document 3: FY2026 needs statement
-
-YOUR JOB: Compare how things CHANGED from 2024 → 2025 → 2026.
-
-ANALYSIS TASKS:
-1. Policy Changes: What priorities appeared, disappeared, or shifted emphasis across the 3 years?
-2. Agency Response Evolution: Did city agencies become more supportive, dismissive, or neutral? How did their tone/responses change?
-3. Emphasis Shifts: Which themes grew stronger? Which faded? What's new in 2026 that wasn't in 2024?
-4. Structural Changes: Did document format, length, or organization change?
-
-CRITICAL: Cite specific text from EACH year when you compare. Say things like "In FY2024 the document stated X, but by FY2026 it shifted to Y."
-
-REQUIRED JSON OUTPUT STRUCTURE:
-{{
-  "community_board": "{borough} {cb_number}",
-  "summary_table": {{
-    "FY2024": "One-sentence summary of FY2024 document's main focus",
-    "FY2025": "One-sentence summary of FY2025 document's main focus",
-    "FY2026": "One-sentence summary of FY2026 document's main focus"
-  }},
-  "narrative_comparison": {{
-    "policy_changes": "2-3 paragraphs comparing how policy priorities evolved from 2024 to 2026. Cite specific examples from each year.",
-    "agency_response_evolution": "2 paragraphs on how city agency responses changed. Quote or reference agency statements from different years.",
-    "emphasis_shifts": "2 paragraphs on what themes grew, shrank, or disappeared. Be specific about which year emphasized what.",
-    "structural_changes": "1 paragraph on document format/structure differences across years."
-  }},
-  "notable_quotes": [
-    {{
-      "year": "FY2024",
-      "quote": "Exact quote from FY2024 document",
-      "significance": "Why this quote matters for year-over-year comparison"
-    }},
-    {{
-      "year": "FY2025",
-      "quote": "Exact quote from FY2025 document",
-      "significance": "How this differs from or continues FY2024 themes"
-    }},
-    {{
-      "year": "FY2026",
-      "quote": "Exact quote from FY2026 document",
-      "significance": "How this represents evolution from prior years"
-    }}
-  ],
-  "final_interpretation": "2-3 sentence assessment of the overall 3-year trajectory. What's the big story here?"
-}}
-
-===== FY2024 DOCUMENT BEGINS =====
-{fy2024[:15000]}
-===== FY2024 DOCUMENT ENDS =====
-
-===== FY2025 DOCUMENT BEGINS =====
-{fy2025[:15000]}
-===== FY2025 DOCUMENT ENDS =====
-
-===== FY2026 DOCUMENT BEGINS =====
-{fy2026[:15000]}
-===== FY2026 DOCUMENT ENDS =====
-
-NOW: Output ONLY the JSON comparison analysis. Do NOT summarize a single year. COMPARE ALL THREE YEARS.
-"""
-
-
-def call_llm(prompt: str, provider: str):
-    """Send the prompt to OpenAI or DeepSeek chat completion API."""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+from _http import RETRY_STATUSES, make_session
+from _llm_cache import cached_response
+from _output import atomic_write
+from _prompt import COMPARE_RULES, compare_request
+from _statements import get_statements_by_cb
+
+WRITE_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+# One keep-alive pool for all worker threads, so each API call skips the
+# TCP + TLS handshake. Rate limits and 5xx on the POSTs are handled by
+# post_with_backoff.
+SESSION = make_session(pool_maxsize=32)
+
+# Requests in flight at once; raise it to match your provider's rate-limit tier
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "10"))
+MAX_ATTEMPTS = 6
+MAX_BACKOFF = 30  # seconds
+
+
+def post_with_backoff(url, **kwargs):
+    """POST, retrying 429/5xx with jittered exponential backoff.
+
+    A numeric Retry-After header from the provider takes precedence over the
+    computed delay, capped at MAX_BACKOFF so one header can't park a worker.
+    The last response is returned as-is once attempts run out.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        response = SESSION.post(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS - 1:
+            return response
+
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = min(MAX_BACKOFF, int(retry_after))
+        else:
+            delay = min(MAX_BACKOFF, 2 ** attempt + random.random())
+        print(f"  {response.status_code} from API, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def call_llm(prompt: str, provider: str, system: str = None):
+    """Send the prompt (after an optional system message) to OpenAI or DeepSeek chat completion API."""
     provider = provider.lower()
 
     if provider == "openai":
@@ -138,26 +71,61 @@ def call_llm(prompt: str, provider: str):
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json",
     }
+    messages = [{"role": "user", "content": prompt}]
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
     payload = {
         "model": model,
-        "messages": [{"role": "user", "content": prompt}],
+        "messages": messages,
     }
 
     # Some hosted models (e.g., gpt-5-mini) only support default temperature.
+    temperature = None
     if not model.startswith("gpt-5"):
-        payload["temperature"] = 0.2
+        temperature = 0.2
+        payload["temperature"] = temperature
 
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=90)
-    response.raise_for_status()
-    data = response.json()
+    def request():
+        response = post_with_backoff(endpoint, headers=headers, json=payload, timeout=90)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
 
-    try:
-        return data["choices"][0]["message"]["content"]
-    except (KeyError, IndexError) as exc:
-        raise RuntimeError(f"Unexpected response from {provider}: {data}") from exc
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError) as exc:
+            raise RuntimeError(f"Unexpected response from {provider}: {data}") from exc
 
+    return cached_response(
+        model, prompt, temperature, request, provider=provider, system=system
+    )
+
+
+def process_cb(cb_num, statements, provider: str, borough: str, output_dir: str):
+    filename = os.path.join(output_dir, f"needs_comparison_{borough}_CB{cb_num}.json")
+    # atomic_write only creates the file once the response is complete
+    if os.path.exists(filename):
+        print(f"  · skip (already analyzed) {filename}")
+        return
+
+    print(f"\nAnalyzing {borough} CB{cb_num} (FY2024-2026)...")
+
+    prompt = compare_request(
+        borough,
+        cb_num,
+        statements["FY2024"],
+        statements["FY2025"],
+        statements["FY2026"],
+    )
+
+    output = call_llm(prompt, provider, system=COMPARE_RULES)
+
+    with atomic_write(filename, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(output.encode("utf-8"))
+
+    print(f"  ✓ Saved {filename}")
 
-def run(provider: str, max_cbs: int, borough: str):
+
+def run(provider: str, max_cbs: int, borough: str, concurrency: int):
     output_dir = os.path.join("api_outputs", provider.lower())
     os.makedirs(output_dir, exist_ok=True)
 
@@ -166,27 +134,16 @@ def run(provider: str, max_cbs: int, borough: str):
     print(f"Found {len(cb_data)} {borough} Community Boards with all 3 years\n")
     print(f"Using provider: {provider}\n")
 
-    for i, (cb_num, statements) in enumerate(cb_data.items()):
-        if i >= max_cbs:
-            break
-
-        print(f"\nAnalyzing {borough} CB{cb_num} (FY2024-2026)...")
-
-        prompt = build_prompt(
-            cb_num,
-            statements["FY2024"],
-            statements["FY2025"],
-            statements["FY2026"],
-            borough,
-        )
-
-        output = call_llm(prompt, provider)
+    selected = list(cb_data.items())[:max_cbs]
 
-        filename = os.path.join(output_dir, f"needs_comparison_{borough}_CB{cb_num}.json")
-        with open(filename, "w") as f:
-            f.write(output)
-
-        print(f"  ✓ Saved {filename}")
+    # Each CB is an independent, network-bound request, so keep several in flight.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(process_cb, cb_num, statements, provider, borough, output_dir)
+            for cb_num, statements in selected
+        ]
+        for future in futures:
+            future.result()
 
 
 if __name__ == "__main__":
@@ -210,6 +167,12 @@ if __name__ == "__main__":
         default="BK",
         help="Borough code to analyze (e.g., BK, BX, MN, QN, SI)",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=LLM_CONCURRENCY,
+        help="Maximum number of community boards to request at once (default: $LLM_CONCURRENCY or 10)",
+    )
     args = parser.parse_args()
 
-    run(args.provider, args.max_cbs, args.borough)
+    run(args.provider, args.max_cbs, args.borough, args.concurrency)
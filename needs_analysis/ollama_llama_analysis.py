@@ -1,25 +1,39 @@
+import os
 import sqlite3
-import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
+
+from _http import make_session
+from _llm_cache import cached_response
+from _ollama import stream_generate
+from _output import atomic_write
 
-OLLAMA_API = "http://localhost:11434/api/generate"
 MODEL = "llama3.2"
+OUTPUT_BUFFER_SIZE = 64 * 1024  # streamed tokens are small, so buffer file writes
+WORKERS = 4  # concurrent Ollama requests; match OLLAMA_NUM_PARALLEL on the server
+TEMPERATURE = 0.2  # low enough for repeatable JSON, so responses are cached
+
+# Keep-alive connections to Ollama shared by the worker threads
+SESSION = make_session(pool_maxsize=WORKERS)
 
 def get_all_statements():
+    """One statement per CB: the most recently scraped row, the same one that
+    ended up in the output file when rows were processed in order."""
     conn = sqlite3.connect("dns_data.db")
     cur = conn.cursor()
-    rows = cur.execute("SELECT id, borough, cb_number, text FROM dns_pdfs").fetchall()
+    rows = cur.execute("""
+        SELECT id, borough, cb_number, text
+        FROM dns_pdfs
+        WHERE id IN (SELECT MAX(id) FROM dns_pdfs GROUP BY borough, cb_number)
+        ORDER BY id
+    """).fetchall()
     conn.close()
     return rows
 
-# Comprehensive LLM prompt
-def analyze(text, borough, cb_number):
-    prompt = f"""
+# Comprehensive LLM prompt. The instructions are identical for every statement
+# and come first so Ollama (llama.cpp) can reuse the cached prompt prefix.
+ANALYSIS_RULES = """
 You are analyzing a New York City Community District Needs Statement.
 
-Borough: {borough}
-Community Board: {cb_number}
-
 TASKS:
 
 1. Concise Summary
@@ -78,38 +92,53 @@ Provide:
 - interpretation
 - theme classification
 
-TEXT:
-{text}
-
 Return your analysis in structured JSON with keys:
 summary, themes, unmet_needs, priority_ranking, cross_sectional_analysis, language_framing_analysis
 """
 
-    payload = {
-        "model": MODEL,
-        "prompt": prompt,
-        "stream": False
-    }
+def analyze(text, borough, cb_number, out=None):
+    prompt = ANALYSIS_RULES + f"""
+Borough: {borough}
+Community Board: {cb_number}
+
+TEXT:
+{text}
+"""
 
-    response = requests.post(OLLAMA_API, json=payload)
-    response.raise_for_status()
+    return cached_response(
+        MODEL,
+        prompt,
+        TEMPERATURE,
+        lambda: stream_generate(SESSION, MODEL, prompt, {"temperature": TEMPERATURE}, out),
+    )
+
+
+def analyze_and_save(borough, cb, text):
+    # get_all_statements yields one row per CB, so concurrent workers never
+    # share an output file
+    filename = f"ollama_analysis_CB{borough}{cb}.json"
+    # atomic_write only creates the file once the response is complete
+    if os.path.exists(filename):
+        print(f"  · skip (already analyzed) {filename}")
+        return
+
+    print(f"\nAnalyzing {borough} CB{cb}...")
+
+    # Stream the response into the output while it generates
+    with atomic_write(filename, buffering=OUTPUT_BUFFER_SIZE) as f:
+        output = analyze(text, borough, cb, out=f)
+        if f.tell() == 0:  # served from the cache, nothing was streamed
+            f.write(output)
 
-    result = response.json()
-    return result["response"]
+    print(f"Saved {filename}!")
 
 
 def run():
     rows = get_all_statements()
 
-    # Process only first 5 records
-    for (id_, borough, cb, text) in rows[:5]:
-        print(f"\nAnalyzing {borough} CB{cb}...")
-        output = analyze(text, borough, cb)
-
-        with open(f"ollama_analysis_CB{borough}{cb}.json", "w") as f:
-            f.write(output)
-
-        print(f"Saved ollama_analysis_CB{borough}{cb}.json!")
+    # Process only the first 5 CBs
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        list(executor.map(lambda row: analyze_and_save(*row[1:]), rows[:5]))
 
 if __name__ == "__main__":
     run()
@@ -1,26 +1,43 @@
-import requests
+import os
+from urllib.parse import quote
 
-def get_raw_pdf_links():
-    api_url = "https://api.github.com/repos/NYCPlanning/labs-cd-needs-statements/contents"
+import orjson
 
-    r = requests.get(api_url)
-    r.raise_for_status()
-    items = r.json()
+from needs_analysis._http import make_session
 
-    pdf_links = []
+REPO = "NYCPlanning/labs-cd-needs-statements"
 
-    # This repo contains folders for each borough's DNS directory
-    for folder in items:
-        if folder["type"] == "dir":
-            subfolder_url = folder["url"]
-            subfolder_items = requests.get(subfolder_url).json()
+session = make_session()
+session.headers["Accept"] = "application/vnd.github+json"
+# An auth token raises GitHub's rate limit from 60 to 5000 requests/hour
+if os.getenv("GITHUB_TOKEN"):
+    session.headers["Authorization"] = f"Bearer {os.getenv('GITHUB_TOKEN')}"
 
-            for f in subfolder_items:
-                if f["name"].lower().endswith(".pdf"):
-                    # f["download_url"] gives the raw PDF file
-                    pdf_links.append(f["download_url"])
 
-    return pdf_links
+def get_json(url):
+    r = session.get(url)
+    r.raise_for_status()
+    # The recursive tree listing runs to several MB; orjson decodes it far faster
+    return orjson.loads(r.content)
+
+
+def get_raw_pdf_links():
+    # One recursive Git Trees call lists every file in the repo, instead of a
+    # contents request per borough folder. HEAD resolves to the default branch.
+    tree = get_json(f"https://api.github.com/repos/{REPO}/git/trees/HEAD?recursive=1")
+    if tree.get("truncated"):
+        print("Warning: GitHub truncated the tree listing; some PDFs may be missing")
+
+    # Same scope as listing each top-level folder: PDFs exactly one directory
+    # deep (e.g. BK/FY2025_Statement_BK01.pdf), not the root or nested folders.
+    # Paths are percent-encoded since some file names contain spaces or '#'.
+    return [
+        f"https://raw.githubusercontent.com/{REPO}/HEAD/{quote(entry['path'])}"
+        for entry in tree["tree"]
+        if entry["type"] == "blob"
+        and entry["path"].count("/") == 1
+        and entry["path"].lower().endswith(".pdf")
+    ]
 
 pdf_urls = get_raw_pdf_links()
 print(pdf_urls)